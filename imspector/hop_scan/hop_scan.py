@@ -22,12 +22,15 @@ Implementation notes:
 import os
 import sys
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5 import QtWidgets, QtCore, QtGui
 import numpy as np
 import specpy as sp
+try:
+    from numba import njit, prange  # optional, speeds up the unhopping
+except ImportError:
+    njit = None
 
-# TODO should we maybe override the created stacks next time around or create new every time?
 # TODO in principle we also could connect to an Imspector at another location, is this interesting, would specpy Stack creation still work? (I guess not)
 # TODO general all checks for equality should take numerical precision into account, i.e. instead of a==b do abs(a-b) < 1e-3*(abs(a)+abs(b)) or similar
 # TODO if there are more than two stacks to unhop, try to unhop them all (check for nunmber of stacks)
@@ -57,6 +60,8 @@ class MainWindow(QtWidgets.QWidget):
         # connecting worker
         self._worker.log.connect(self.log)
 
+        # log messages waiting to be shown
+        self._log_buffer = []
 
         # log output
         self._log = QtWidgets.QTextEdit(self)
@@ -67,6 +72,11 @@ class MainWindow(QtWidgets.QWidget):
         font.setPointSizeF(font.pointSizeF()+2)
         self._log.setFont(font)
 
+        # text formats of the log output (time and message types)
+        self._log_time_format = text_format('gray')
+        colors = {0: 'black', 1: 'red', 2: 'green', 3: 'magenta'}
+        self._log_formats = {type: text_format(color) for type, color in colors.items()}
+
         # tool bar
         toolbar = QtWidgets.QToolBar(self)
 
@@ -104,11 +114,38 @@ class MainWindow(QtWidgets.QWidget):
         """
         Appends a message to the log window prefixing it with the time and possible with different colors.
         :param text: The message to display.
-        :param type: An integer indicating the color of the text (see dictionary below).
+        :param type: An integer indicating the color of the text (see colors in __init__).
         """
-        colors = {0: 'black', 1: 'red', 2: 'green', 3: 'magenta'}
-        color = colors[type]
-        self._log.append('<font color="gray">[{}]:</font> <font color="{}">{}</font>'.format(datetime.now().time().isoformat()[:-5], color, text))  # lazy with the time format (just killing 5 decimal places here)
+        fmt = self._log_formats[type]
+        if not self._log_buffer:
+            # first message since the last flush, flush all messages arriving until control returns to the event loop
+            QtCore.QTimer.singleShot(0, self._flush_log)
+        self._log_buffer.append((time.strftime('%H:%M:%S'), text, fmt))
+
+    def _flush_log(self):
+        """
+        Shows all buffered log messages at once in the log window (only one layout pass of the log window).
+        """
+        # only follow the new messages if the log was scrolled to the end before
+        scroll_bar = self._log.verticalScrollBar()
+        at_end = scroll_bar.value() == scroll_bar.maximum()
+
+        # insert as plain text with the prepared formats (no HTML parsing)
+        document = self._log.document()
+        cursor = QtGui.QTextCursor(document)
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.beginEditBlock()
+        for timestamp, text, fmt in self._log_buffer:
+            if not document.isEmpty():
+                cursor.insertBlock()
+            cursor.insertText(f'[{timestamp}]: ', self._log_time_format)
+            cursor.insertText(text, fmt)
+        cursor.endEditBlock()
+        self._log_buffer = []
+
+        # scroll to the end
+        if at_end:
+            scroll_bar.setValue(scroll_bar.maximum())
         
     def closeEvent(self, event):
         """
@@ -160,14 +197,15 @@ class Worker(QtCore.QObject):
         try:
             msr = self.im.active_measurement()
         except Exception as e:
-            self.log.emit(' Could not obtain active measurement. ({})'.format(e), 1)
+            self.log.emit(f' Could not obtain active measurement. ({e})', 1)
             return False
 
         # get active configuration
         cfg = msr.active_configuration()
 
         # check that name contains xyc
-        if 'xyc' not in cfg.name():
+        cfg_name = cfg.name()
+        if 'xyc' not in cfg_name:
             self.log.emit(' Warning: Active configuration name does not contain "xyc".', 3)
 
         # check custom axis
@@ -189,14 +227,14 @@ class Worker(QtCore.QObject):
         offset = pA['axis']['off']
         resolution = pA['axis']['res']
         pixel_size = pA['axis']['psz']
-        self.log.emit('Custom axis: length: {}, offset: {}, resolution: {}, pixel size: {}'.format(length, offset, resolution, pixel_size), 2)
+        self.log.emit(f'Custom axis: length: {length}, offset: {offset}, resolution: {resolution}, pixel size: {pixel_size}', 2)
 
         pS = cfg.parameters('ExpControl')
 
         scan_mode = pS['scan']['range']['scanmode']
         square_pixels = pS['scan']['range']['square_pixels']
 
-        self.log.emit('Scan range type {} and square pixels: {}'.format(scan_mode, square_pixels), 2)
+        self.log.emit(f'Scan range type {scan_mode} and square pixels: {square_pixels}', 2)
         if square_pixels:
             self.log.emit("Warning: Most probably there shouldn't be square pixels.", 1)
         
@@ -205,8 +243,8 @@ class Worker(QtCore.QObject):
             length = ax['len']
             offset = ax['off']
             resolution = ax['res']
-            üixel_size = ax['psz']
-            self.log.emit('Axis {}: length: {}, offset: {}, resolution: {}, pixel size: {}:'.format(axis, length, offset, resolution, pixel_size), 2)
+            pixel_size = ax['psz']
+            self.log.emit(f'Axis {axis}: length: {length}, offset: {offset}, resolution: {resolution}, pixel size: {pixel_size}:', 2)
             
         # check consistency
         
@@ -214,21 +252,21 @@ class Worker(QtCore.QObject):
         x_px = pS['scan']['range']['x']['psz']
         ca_eff_len = pA['axis']['res'] *  pA['axis']['psz']
         if (x_px - ca_eff_len) / (x_px + ca_eff_len) > 0.01:
-            self.log.emit('Pixel hop size {} in x does not match effective length of custom axis {}, adjust.'.format(x_px, ca_eff_len), 1)
+            self.log.emit(f'Pixel hop size {x_px} in x does not match effective length of custom axis {ca_eff_len}, adjust.', 1)
             return False
         
         # pixel size along custom axis and along y axis
         y_px = pS['scan']['range']['y']['psz']
         ca_px = pA['axis']['psz']
         if y_px != ca_px:
-            self.log.emit('Warning: pixel size in y {} does not equal pixel size along custom axis (no eff. square pixels). Intended?'.format(y_px, ca_px), 3)
+            self.log.emit(f'Warning: pixel size in y {y_px} does not equal pixel size along custom axis {ca_px} (no eff. square pixels). Intended?', 3)
         
         return True
 
     def run_measurement(self):
         """
         Checks and runs the hop scanning measurement. Times it also and afterwards unhop the scan, creating
-        two new stacks in the current active measurement.
+        two new stacks in the current active measurement (or overwriting the ones of a previous run).
         """
         if not self.im:
             self.log.emit('Not connected to Imspector.', 1)
@@ -247,7 +285,7 @@ class Worker(QtCore.QObject):
         t1 = time.perf_counter()
         self.im.run(msr)
         t2 = time.perf_counter()
-        self.log.emit('Finished ({:.2f}s)'.format(t2 - t1), 2)
+        self.log.emit(f'Finished ({t2 - t1:.2f}s)', 2)
 
         # get data out again
         cfg = msr.active_configuration()
@@ -259,57 +297,163 @@ class Worker(QtCore.QObject):
             return
 
         # get both and unhop
+        cfg_name = cfg.name()
+        unhopped = False
         for idx in range(number_stacks):
             stack = cfg.stack(idx)
+            name = stack.name()
 
             # unhopping
-            self.log.emit('Unhopping stack {}.'.format(stack.name()), 2)
+            self.log.emit(f'Unhopping stack {name}.', 2)
 
             # get stack data (note: dimensions are reversed to what one would expect)
             data = stack.data()
+            if data.size == 0:
+                self.log.emit(f'Skipping empty stack {name}.', 3)
+                continue
 
             # order: T, C, Y, X
+            T, C, Y, X = data.shape
+
+            # create output stack first (or reuse the one of a previous run), order: None, T, Y, X(full)
+            stack_type = stack.type()
+            sizes = (1, T, Y, X * C)[::-1]  # one has to reserve the order of the dimensions again here
+            s = find_stack(msr, name + ' Unhopped', stack_type, sizes)
+            if s is None:
+                s = msr.create_stack(stack_type, sizes)
+            d = s.data()
 
             # unhop
-            new_data = np.transpose(data, axes=[0, 2, 3, 1])  # T, Y, X, C
-            s = new_data.shape
-            new_data = np.reshape(new_data, [1, s[0], s[1], s[2] * s[3]])  # None, T, Y, X(full)
-
-            # create output stack
-            s = msr.create_stack(stack.type(),
-                                 new_data.shape[::-1])  # one has to reserve the order of the dimensions again here
-            d = s.data()
-            d[:] = new_data[:]
-            s.set_name(stack.name() + ' Unhopped')
-            s.set_description('config {} stack {} unhopped'.format(cfg.name(), stack.name()))
+            unhop(data, d)
+            s.set_name(name + ' Unhopped')
+            s.set_description(f'config {cfg_name} stack {name} unhopped')
 
             # fix lengths, offsets, labels
-            lengths = stack.lengths()
-            lengths[2] = lengths[3]
-            lengths[3] = 1.0
-            s.set_lengths(lengths)
+            _rewrite_axis_meta(stack, s)
+            unhopped = True
+
+        # update only once after all stacks are pushed (specpy has no way to batch the meta data setters)
+        if unhopped:
+            msr.update()  # does this tell Imspector to update the colorbar ranges of the pushed stacks?
+
 
-            offsets = stack.offsets()
-            offsets[2] = offsets[3]
-            offsets[3] = -0.5
-            s.set_offsets(offsets)
+def unhop(data: np.ndarray, out: np.ndarray):
+    """
+    Unhops the data of a stack into the data of the output stack.
+    :param data: The hopped data (order: T, C, Y, X).
+    :param out: The data of the output stack (order: None, T, Y, X(full)), is written in place.
+    """
+    if njit is not None:
+        _unhop_kernel(data.shape[1])(data, out)
+        return
+
+    # a freshly created stack is contiguous, so the view on it does not copy and the transposed data is gathered
+    # into it in a single pass
+    T, C, Y, X = data.shape
+    new_data = np.moveaxis(data, 1, -1)  # T, Y, X, C
+    if out.flags.c_contiguous:
+        out_view = out.reshape(T, Y, X, C)
+
+        def copy(y0, y1):
+            out_view[:, y0:y1] = new_data[:, y0:y1]
+
+        # NumPy releases the GIL while copying, so blocks along Y can be copied in parallel (T is 1 for a single xyc
+        # scan)
+        bounds = np.linspace(0, Y, min(Y, os.cpu_count() or 1) + 1).astype(int)
+        with ThreadPoolExecutor(len(bounds) - 1) as executor:
+            list(executor.map(copy, bounds[:-1], bounds[1:]))
+    else:
+        # reshape would silently copy and we would write into a temporary, do it the slow way
+        np.copyto(out, np.reshape(new_data, out.shape))
+
+
+def find_stack(msr, name: str, stack_type, sizes):
+    """
+    Searches a measurement for a stack with a given name, type and sizes.
+    :param msr: The measurement.
+    :param name: The full name of the stack.
+    :param stack_type: The data type of the stack.
+    :param sizes: The sizes of the stack (in specpy order).
+    :return: The first matching stack or None if there is none.
+    """
+    for idx in range(msr.number_of_stacks()):
+        stack = msr.stack(idx)
+        if stack.name() == name and stack.type() == stack_type and tuple(stack.sizes()) == tuple(sizes):
+            return stack
+    return None
+
+
+def _rewrite_axis_meta(src_stack, dst_stack):
+    """
+    Sets lengths, offsets and labels of the unhopped stack from the ones of the hopped stack. The custom axis (3rd
+    dimension) is merged into the x axis by unhopping, so the 4th dimension moves to the 3rd place and the 4th
+    dimension of the unhopped stack is a dummy one.
+    :param src_stack: The hopped stack.
+    :param dst_stack: The created unhopped stack.
+    """
+    # (getter, setter, value of the emptied axis)
+    meta = ((src_stack.lengths, dst_stack.set_lengths, 1.0),
+            (src_stack.offsets, dst_stack.set_offsets, -0.5),
+            (src_stack.labels, dst_stack.set_labels, 'None'))
+    for getter, setter, empty in meta:
+        values = getter()
+        values[2] = values[3]
+        values[3] = empty
+        setter(values)
+
+
+# compiled unhop kernels by number of hops
+_unhop_kernels = {}
+
+
+def _unhop_kernel(C: int):
+    """
+    Compiled version of unhop (needs Numba), runs in parallel over T and Y (T is 1 for a single xyc scan). The
+    kernel is specialized for a fixed number of hops, so that the compiler can unroll the innermost loop over them.
+    Kernels are only compiled once per session.
+    :param C: Number of hops.
+    :return: The compiled kernel, called with (data, out) like unhop.
+    """
+    if C not in _unhop_kernels:
+        @njit(parallel=True)
+        def kernel(data, out):
+            T, _, Y, X = data.shape
+            for ty in prange(T * Y):
+                t = ty // Y
+                y = ty % Y
+                for x in range(X):
+                    for c in range(C):
+                        out[0, t, y, x * C + c] = data[t, c, y, x]
+        _unhop_kernels[C] = kernel
+    return _unhop_kernels[C]
+
+
+def text_format(color: str) -> QtGui.QTextCharFormat:
+    """
+    Creates a text format with a given foreground color.
+    :param color: The name of the color.
+    :return: The QTextCharFormat.
+    """
+    fmt = QtGui.QTextCharFormat()
+    fmt.setForeground(QtGui.QColor(color))
+    return fmt
 
-            labels = stack.labels()
-            labels[2] = labels[3]
-            labels[3] = 'None'
-            s.set_labels(labels)
 
-        msr.update()  # does this tell Imspector to update the colorbar ranges of the pushed stacks?
+# already loaded icons by name
+_icon_cache = {}
 
 
 def load_icon(name: str) -> QtGui.QIcon:
     """
-    Loads an icon (as QIcon) from our resources place.
+    Loads an icon (as QIcon) from our resources place. Each icon is only loaded once.
     :param name: Just the name part from the icon file.
     :return: The QIcon.
     """
+    if name in _icon_cache:
+        return _icon_cache[name]
     path = os.path.join(root_path, 'resources', 'icon_' + name + '.png')
     icon = QtGui.QIcon(path)
+    _icon_cache[name] = icon
     return icon
 
 
@@ -322,7 +466,8 @@ def exception_hook(type, value, traceback):
 
 if __name__ == '__main__':
 
-    # fix PyQt5 eating exceptions (see http://stackoverflow.com/q/14493081/1536976)
+    # fix PyQt5 eating exceptions (see http://stackoverflow.com/q/14493081/1536976), must be a wrapper, PyQt5 >= 5.5
+    # aborts on unhandled exceptions in slots if sys.excepthook is sys.__excepthook__
     sys.excepthook = exception_hook
 
     # root path is file path
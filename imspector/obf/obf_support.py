@@ -9,14 +9,26 @@
       Include in your project as "import obf_support"
 
       File
-      - Open an OBF file with "obf = obf_support.File(path_to_file)", that will read all meta data (including stack meta data)
+      - Open an OBF file with "obf = obf_support.File(path_to_file)", that will read the file meta data (the stack meta
+        data is read lazily, i.e. when a stack is accessed the first time)
       - Access the following attributes: format_version, description, stacks
-      - Close with "obf.close()" (optional, is also closed automatically on deletion of the File object)
+      - Prepare the data of all stacks at once with "obf.prefetch_all()" (in parallel, faster for many compressed
+        stacks; only compressed and chunked stacks are loaded into memory, uncompressed contiguous stacks only get a view
+        on the memory mapped file); a File can be used from several threads
+      - Close with "obf.close()" (optional, is also closed automatically on deletion of the File object); afterwards
+        stacks, stack names and stack data that were not accessed before cannot be read anymore (raises a ValueError)
 
       Stack
       - Each Stack has attributes: format_version, name, description, shape, lengths, offsets, data_type, data
       - data returns a NumPy array containing the stack data (the stack data is loaded from the file lazily, i.e. when the
-        attribute is accessed the first time)
+        attribute is accessed the first time; uncompressed stack data is a read-only view on the memory mapped file)
+      - as long as an array returned by data or read_roi is alive, the memory mapping of the file stays alive too (on
+        Windows the file cannot be deleted or overwritten meanwhile), even after "obf.close()", use
+        "np.array(stack.data)" for an independent copy
+      - data has the shape of the stack and is Fortran-contiguous (the first dimension changes fastest like in the file),
+        use "stack.data.T" for a C-contiguous array with reversed dimensions without copying
+      - read_roi(slices) returns only a part of the data, e.g. "stack.read_roi((slice(None), slice(None), 0))" for the
+        first XY slice of a 3D stack (for uncompressed stacks only that part is read from the file)
 
   Example: see obf_support_example.py
 
@@ -24,12 +36,15 @@
 
       - Relies on the struct module (https://docs.python.org/3.9/library/struct.html).
       - In particular see the format characters of the struct module (https://docs.python.org/3.9/library/struct.html#format-characters).
+      - The file is memory mapped (https://docs.python.org/3.9/library/mmap.html) and headers are unpacked from the mapping.
+      - Compressed stacks are decompressed with zlib-ng (https://pypi.org/project/zlib-ng/) or isal
+        (https://pypi.org/project/isal/) if one of them is installed (faster), otherwise with zlib.
       - Opened issue at https://github.com/AbberiorInstruments/ImspectorDocs/issues/9 about
         + Constant OMAS_BF_MAX_DIMENSIONS is not explained, the value is 15.
         + Data type of OMAS_DT is not specified, it's an enum type in C++, which is stored as uint32.
       - In the future maybe:
         + Writing to OBF would in principle be possible (using the struct module)
-        + Read part (slice) of data (use flush points), currently data is read all at once (impractical for very large files)
+        + Read part (slice) of compressed data (use flush points), currently compressed data is read all at once (impractical for very large files)
         + may still crash if not all data is written in a stack (haven't seen such a stack yet)
         + if there is a problem with a stack (like unknown data type), we could simply ignore the stack and print a warning instead
 
@@ -38,8 +53,20 @@
 
 from __future__ import annotations
 from collections import namedtuple
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, partial
 import struct
-import zlib
+import mmap
+import threading
+try:
+    # optional faster drop-in replacements of zlib
+    from zlib_ng import zlib_ng as zlib
+except ImportError:
+    try:
+        from isal import isal_zlib as zlib
+    except ImportError:
+        import zlib
 import math
 import numpy as np
 
@@ -48,6 +75,11 @@ long_fmt = '<Q'
 long_len = struct.calcsize(long_fmt)
 long_unpack = struct.Struct(long_fmt).unpack_from
 
+# single int value
+int_fmt = '<I'
+int_len = struct.calcsize(int_fmt)
+int_unpack = struct.Struct(int_fmt).unpack_from
+
 # file header = char[10], uint32, uint64, uint32
 file_header_fmt = '<10sIQI'
 file_header_len = struct.calcsize(file_header_fmt)
@@ -58,6 +90,8 @@ FILE_MAGIC_HEADER = b'OMAS_BF\n\xff\xff'
 stack_header_fmt = '<16s17I30d5I3Q'
 stack_header_len = struct.calcsize(stack_header_fmt)
 stack_header_unpack = struct.Struct(stack_header_fmt).unpack_from
+stack_name_length_offset = struct.calcsize('<16s17I30d3I')  # name length is the fourth uint32
+stack_next_pos_offset = stack_header_len - long_len  # next stack position is the last uint64
 STACK_MAGIC_HEADER = b'OMAS_BF_STACK\n\xff\xff'
 
 # stack footer version 1 = uint32, uint32[15], uint32[15]
@@ -112,16 +146,64 @@ omas_data_types = {0x00000001: np.uint8, 0x00000002: np.int8, 0x00000004: np.uin
 Fraction = namedtuple('Fraction', ('numerator', 'denominator'))
 
 
+def _decode_string(string) -> str:
+    """
+    For internal use only.
+    :param string: Encoded string (bytes or memoryview, which is decoded without copying it first)
+    :return: Decoded string
+    """
+    try:
+        return str(string, 'utf-8')
+    except UnicodeDecodeError:
+        # fallback encoding for very old (<2008) files
+        return str(string, 'iso-8859-1')
+
+
+def _decode_uncompressed(parts: list, *, data_type, shape: tuple) -> np.ndarray:
+    """
+    For internal use only. Converts uncompressed stack data to a NumPy array.
+    :param parts: Views of the parts of the stack data in the memory mapped file
+    :param data_type: NumPy data type of the stack
+    :param shape: Shape of the stack
+    :return: NumPy array (first dimension is the fastest changing one, i.e. Fortran order)
+    """
+    if len(parts) == 1:
+        # contiguous in the file, directly use the memory mapped file (no copy at all, only the parts that are accessed
+        # are actually read from disk)
+        data = parts[0]
+    else:
+        # chunked, assemble the chunks (join allocates the result once and copies each chunk with a single memcpy from
+        # the memory mapped file, no Python level loop over the data)
+        data = b"".join(parts)
+    return np.ndarray(shape=shape, dtype=data_type, buffer=data, order='F')
+
+
+def _decode_compressed(parts: list, *, data_type, shape: tuple) -> np.ndarray:
+    """
+    For internal use only. Uncompresses compressed stack data to a NumPy array.
+    :param parts: Views of the parts of the compressed stack data in the memory mapped file
+    :param data_type: NumPy data type of the stack
+    :param shape: Shape of the stack
+    :return: NumPy array (first dimension is the fastest changing one, i.e. Fortran order)
+    """
+    data = parts[0] if len(parts) == 1 else b"".join(parts)
+    zobj = zlib.decompressobj()
+    data = zobj.decompress(data)
+    # data = zlib.decompress(data) # that gave "zlib.error: Error -5 while decompressing data: incomplete or truncated stream" sometimes
+    return np.ndarray(shape=shape, dtype=data_type, buffer=data, order='F')
+
+
 class File:
     """
     OBF file access.
 
-    Reads the file header, stack header and stack footer of all stacks contained in the file.
+    Reads the file header. The stack header and stack footer of a stack are read when the stack is accessed the first
+    time.
 
     Attributes:
         - format_version
         - description
-        - stacks (list of Stack)
+        - stacks (sequence of Stack)
     """
 
     def __init__(self, file_path: str):
@@ -132,18 +214,21 @@ class File:
         :param file_path: path of the OBF file
         """
         # we cannot use "with open as" because we read the data stacks content later
+        self._mm = None
         try:
             # open the file at the given file path
             self._file = open(file_path, 'rb')
-            self._file.seek(0, 2)  # seek to the end of the file
-            file_size = self._file.tell()
-            self._file.seek(0)
+
+            # map the whole file into memory, the headers are unpacked directly from the mapping and all other reads
+            # are memory copies without system calls
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._file_size = len(self._mm)
 
             # read the obf file header
-            data = self._file.read(file_header_len)
-            magic_header, self.format_version, first_stack_pos, description_len = file_header_unpack(data)
+            magic_header, self.format_version, first_stack_pos, description_len = file_header_unpack(self._mm, 0)
             if magic_header != FILE_MAGIC_HEADER:
                 raise RuntimeError('Magic file header not found.')
+            self._mm.seek(file_header_len)
 
             # read file description
             self.description = self._read_string(description_len)
@@ -151,8 +236,8 @@ class File:
             # read file meta data
             if self.format_version >= 2:
                 # read meta data position
-                file_meta_data_pos = long_unpack(self._file.read(long_len))[0]
-                self._file.seek(file_meta_data_pos)
+                file_meta_data_pos = long_unpack(self._mm.read(long_len))[0]
+                self._mm.seek(file_meta_data_pos)
 
                 self.meta = {}
                 key = self._read_string()
@@ -161,182 +246,16 @@ class File:
                     self.meta[key] = value
                     key = self._read_string()
 
-            # read all the stacks
+            # only follow the chain of stack positions, the stacks are read when they are accessed the first time
+            stack_positions = []
             next_stack_pos = first_stack_pos
-            self.stacks = []
             while next_stack_pos != 0:
-
-                # create new stack
-                stack = Stack(self)
-
-                # seek to position of next stack header
-                self._file.seek(next_stack_pos)
-
-                # read stack header
-                data = self._file.read(stack_header_len)
-                values = stack_header_unpack(data)
-                if values[0] != STACK_MAGIC_HEADER:
+                # check the magic stack header already here, so that a corrupt file or stack position fails on opening
+                if self._mm[next_stack_pos:next_stack_pos + len(STACK_MAGIC_HEADER)] != STACK_MAGIC_HEADER:
                     raise RuntimeError('Magic stack header not found.')
-
-                # interpret stack header
-                stack.format_version = values[1]
-                stack.rank = values[2]
-                stack.shape = values[3:17][:stack.rank]
-                stack.lengths = values[18:32][:stack.rank]
-                stack.offsets = values[33:47][:stack.rank]
-                value = values[48]
-                if value not in omas_data_types:
-                    raise RuntimeError('Unsupported data type {}.'.format(value))
-                else:
-                    stack.data_type = omas_data_types[value]
-                stack._compression_type = values[49]
-                # compression_level = values[50] # relatively uninteresting, we ignore it
-                name_length = values[51]
-                description_length = values[52]
-                stack._data_length = values[54]  # data_len_disk
-                next_stack_pos = values[55]
-                stack.name = self._read_string(name_length)
-                stack.description = self._read_string(description_length)
-
-                stack._data_pos = self._file.tell()
-                footer_pos = stack._data_pos + stack._data_length
-
-                # additionally we compute a dimensionality of a stack which is the number of elements in shape minus
-                # trailing single value dimensions; helps finding the 2D image stacks for example
-                dimensionality = len(stack.shape)
-                while dimensionality > 1 and stack.shape[dimensionality - 1] == 1:
-                    dimensionality -= 1
-                stack.dimensionality = dimensionality
-
-                # default footer
-                footer = {
-                    'stack_end_used_disk': file_size,
-                    'samples_written': np.prod(stack.shape),
-                    'chunk_positions': [[0, 0]]
-                }
-
-                # read and interpret stack footer (for format version >= 1)
-                if stack.format_version >= 1:
-                    self._file.seek(footer_pos)
-
-                    # read version 1 part
-                    data = self._file.read(stack_footer_v1_len)
-                    values = stack_footer_v1_unpack(data)
-                    footer_length = values[0]
-                    footer['has_col_positions'] = values[1:15][:stack.rank]
-                    footer['has_col_labels'] = values[16:30][:stack.rank]
-
-                    if stack.format_version >= 2:
-                        # read version 1A part
-                        data = self._file.read(stack_footer_v1a_len)
-                        values = stack_footer_v1a_unpack(data)
-                        footer['metadata_length'] = values[0]
-
-                        # read version 2 part
-                        data = self._file.read(stack_footer_v2_len)
-                        values = stack_footer_v2_unpack(data)
-                        stack.si_value = SIUnit(values[0:19])
-                        stack.si_dimensions = []
-                        for i in range(stack.rank):
-                            stack.si_dimensions.append(SIUnit(values[i * 19:(i + 1) * 19]))
-
-                    if stack.format_version >= 3:
-                        # read version 3 part
-                        data = self._file.read(stack_footer_v3_len)
-                        values = stack_footer_v3_unpack(data)
-                        footer['num_flush_points'] = values[0]
-                        footer['flush_block_size'] = values[1]
-
-                    if stack.format_version >= 4:
-                        # read version 4 part
-                        data = self._file.read(stack_footer_v4_len)
-                        values = stack_footer_v4_unpack(data)
-                        footer['tag_dictionary_length'] = values[0]
-
-                    if stack.format_version >= 5:
-                        # read version 5 part
-                        data = self._file.read(stack_footer_v5_len)
-                        values = stack_footer_v5_unpack(data)
-                        footer['min_format_version'] = values[1]
-
-                    if stack.format_version >= 6:
-                        # read version 5a part
-                        data = self._file.read(stack_footer_v5a_len)
-                        values = stack_footer_v5a_unpack(data)
-                        footer['stack_end_used_disk'] = values[0]
-
-                        # read version 6 part
-                        data = self._file.read(stack_footer_v6_len)
-                        values = stack_footer_v6_unpack(data)
-                        footer['samples_written'] = values[0]
-                        footer['num_chunk_positions'] = values[1]
-
-                    # omit possible footer entries from later versions
-                    self._file.seek(footer_pos + footer_length)
-
-                    # read label strings
-                    stack.labels = [self._read_string() for _ in range(stack.rank)]
-
-                    # read col positions
-                    if 'has_col_positions' in footer:
-                        stack.col_positions = {}
-                        for axis, has_them in enumerate(footer['has_col_positions']):
-                            if has_them:
-                                # read doubles as positions
-                                fmt = '<{}d'.format(stack.shape[axis])
-                                data = self._file.read(struct.calcsize(fmt))
-                                values = struct.unpack_from(fmt, data)
-                                stack.col_positions[axis] = values
-
-                    # read col labels
-                    if 'has_col_labels' in footer:
-                        stack.col_labels = {}
-                        for axis, has_them in enumerate(footer['has_col_labels']):
-                            if has_them:
-                                # read labels
-                                labels = []
-                                for _ in range(stack.shape[axis]):
-                                    label = self._read_string()
-                                    labels.append(label)
-                                stack.col_labels[axis] = labels
-
-                    # read metadata
-                    if 'metadata_length' in footer:
-                        stack.metadata = self._read_string(footer['metadata_length'])
-
-                    # read flush positions
-                    if 'num_flush_points' in footer:
-                        length = footer['num_flush_points']
-                        fmt = '<{}Q'.format(length)
-                        data = self._file.read(struct.calcsize(fmt))
-                        values = struct.unpack_from(fmt, data)
-                        footer['flush_positions'] = values
-
-                    # read tag dictionary
-                    if 'tag_dictionary_length' in footer:
-                        stack.tag_dictionary = {}
-                        length = footer['tag_dictionary_length']
-                        if length > 0:
-                            # read key, value pairs until len(key) is zero
-                            key = self._read_string()
-                            while len(key) > 0:
-                                value = self._read_string()
-                                stack.tag_dictionary[key] = value
-                                key = self._read_string()
-
-                    # read chunk positions
-                    chunk_positions = [[0, 0]]
-                    for _ in range(footer.get('num_chunk_positions', 0)):
-                        fmt = '<2Q'
-                        data = self._file.read(struct.calcsize(fmt))
-                        values = struct.unpack_from(fmt, data)
-                        chunk_positions.append(values)
-                    footer['chunk_positions'] = chunk_positions
-
-                stack.footer = footer
-
-                # append stack to list
-                self.stacks.append(stack)
+                stack_positions.append(next_stack_pos)
+                next_stack_pos = long_unpack(self._mm, next_stack_pos + stack_next_pos_offset)[0]
+            self.stacks = _StackList(self, stack_positions)
         except:
             self.close()
             raise
@@ -344,16 +263,44 @@ class File:
     def find_stack_by_name(self, name_part: str) -> list[Stack]:
         """
         Small convenience method. Will return all stacks in this OBF file where string is contained in the stack name.
+        Only the names of the stacks are read for that.
         """
-        return [stack for stack in self.stacks if name_part in stack.name]
+        stacks = self.stacks
+        return [stacks[i] for i, name in enumerate(stacks.names()) if name_part in name]
+
+    def prefetch_all(self, max_workers: int = None):
+        """
+        Prepares the data of all stacks in parallel threads (decompression runs in parallel, zlib releases the GIL).
+        Only compressed and chunked stacks are loaded into memory, uncompressed stacks stored contiguously in the file
+        only get a view on the memory mapped file (no reading from disk). Reading the data only uses positional access
+        to the memory mapped file, which can be shared by threads.
+
+        :param max_workers: Maximal number of threads, default is the one of ThreadPoolExecutor
+        """
+        with ThreadPoolExecutor(max_workers) as executor:
+            list(executor.map(lambda stack: stack.data, self.stacks))
 
     def close(self):
         """
-        Closes the file if it isn't closed already.
+        Closes the file if it isn't closed already. The memory mapping of the file (and on Windows the lock on the
+        file) is only released when the last array returned by data or read_roi of a stack is gone.
         """
+        # stack data arrays may still refer to the memory mapped file, so it is not closed explicitly here but only
+        # unmapped when the last reference to it is gone
+        self._mm = None
         if not self._file.closed:
             self._file.close()
 
+    def _mapping(self) -> mmap.mmap:
+        """
+        For internal use only.
+        :return: The memory mapped file, raises a ValueError if the file is closed already.
+        """
+        mm = self._mm
+        if mm is None:
+            raise ValueError('File is closed')
+        return mm
+
     def _read_string(self, length: int = None) -> str:
         """
         For internal use only.
@@ -361,25 +308,209 @@ class File:
         :return: Decoded string
         """
         if length is None:
-            fmt = '<I'
-            data = self._file.read(struct.calcsize(fmt))
-            length = struct.unpack_from(fmt, data)[0]
+            length = int_unpack(self._mm.read(int_len))[0]
 
-        fmt = '<{}s'.format(length)
-        data = self._file.read(struct.calcsize(fmt))
-        string = struct.unpack_from(fmt, data)[0]  # unpack always returns a tuple
-        try:
-            string = string.decode('utf-8')
-        except UnicodeDecodeError:
-            # fallback encoding for very old (<2008) files
-            string = string.decode('iso-8859-1')
+        return _decode_string(self._mm.read(length))
 
-        return string
+    def _read_stack_header(self, stack_pos: int) -> Stack:
+        """
+        Internal function. Reads the stack header and stack footer of a stack.
 
-    def _read_stack(self, stack: Stack):
+        :param stack_pos: Position of the stack header in the file
+        :return: A Stack object containing all meta data
         """
-        Internal function. Reads the data array from a stack from the OBF file as a NumPy array and stores it as the
-        _data attribute of the stack. If called a second time, will re-read the stack.
+        mm = self._mapping()
+
+        # create new stack
+        stack = Stack(self)
+
+        # read stack header
+        values = stack_header_unpack(mm, stack_pos)
+        if values[0] != STACK_MAGIC_HEADER:
+            raise RuntimeError('Magic stack header not found.')
+
+        # interpret stack header
+        stack.format_version = values[1]
+        stack.rank = values[2]
+        stack.shape = values[3:3 + stack.rank]
+        stack.lengths = values[18:18 + stack.rank]
+        stack.offsets = values[33:33 + stack.rank]
+        value = values[48]
+        stack.data_type = omas_data_types.get(value)
+        if stack.data_type is None:
+            raise RuntimeError('Unsupported data type {}.'.format(value))
+        stack._compression_type = values[49]
+        # compression_level = values[50] # relatively uninteresting, we ignore it
+        name_length = values[51]
+        description_length = values[52]
+        stack._data_length = values[54]  # data_len_disk
+        # next_stack_pos = values[55] # already known
+        # name and description follow the header, decode them directly from the memory mapped file
+        name_pos = stack_pos + stack_header_len
+        strings = memoryview(mm)[name_pos:name_pos + name_length + description_length]
+        stack.name = _decode_string(strings[:name_length])
+        stack.description = _decode_string(strings[name_length:])
+
+        stack._data_pos = name_pos + name_length + description_length
+        footer_pos = stack._data_pos + stack._data_length
+
+        # additionally we compute a dimensionality of a stack which is the number of elements in shape minus
+        # trailing single value dimensions; helps finding the 2D image stacks for example
+        dimensionality = len(stack.shape)
+        while dimensionality > 1 and stack.shape[dimensionality - 1] == 1:
+            dimensionality -= 1
+        stack.dimensionality = dimensionality
+
+        # default footer
+        footer = {
+            'stack_end_used_disk': self._file_size,
+            'samples_written': np.prod(stack.shape),
+            'chunk_positions': [[0, 0]]
+        }
+
+        # read and interpret stack footer (for format version >= 1)
+        if stack.format_version >= 1:
+            mm.seek(footer_pos)
+
+            # read version 1 part
+            data = mm.read(stack_footer_v1_len)
+            values = stack_footer_v1_unpack(data)
+            footer_length = values[0]
+            footer['has_col_positions'] = values[1:1 + stack.rank]
+            footer['has_col_labels'] = values[16:16 + stack.rank]
+
+            if stack.format_version >= 2:
+                # read version 1A part
+                data = mm.read(stack_footer_v1a_len)
+                values = stack_footer_v1a_unpack(data)
+                footer['metadata_length'] = values[0]
+
+                # read version 2 part
+                data = mm.read(stack_footer_v2_len)
+                values = stack_footer_v2_unpack(data)
+                stack.si_value = SIUnit(values[0:19])
+                stack.si_dimensions = []
+                for i in range(stack.rank):
+                    stack.si_dimensions.append(SIUnit(values[i * 19:(i + 1) * 19]))
+
+            if stack.format_version >= 3:
+                # read version 3 part
+                data = mm.read(stack_footer_v3_len)
+                values = stack_footer_v3_unpack(data)
+                footer['num_flush_points'] = values[0]
+                footer['flush_block_size'] = values[1]
+
+            if stack.format_version >= 4:
+                # read version 4 part
+                data = mm.read(stack_footer_v4_len)
+                values = stack_footer_v4_unpack(data)
+                footer['tag_dictionary_length'] = values[0]
+
+            if stack.format_version >= 5:
+                # read version 5 part
+                data = mm.read(stack_footer_v5_len)
+                values = stack_footer_v5_unpack(data)
+                footer['min_format_version'] = values[1]
+
+            if stack.format_version >= 6:
+                # read version 5a part
+                data = mm.read(stack_footer_v5a_len)
+                values = stack_footer_v5a_unpack(data)
+                footer['stack_end_used_disk'] = values[0]
+
+                # read version 6 part
+                data = mm.read(stack_footer_v6_len)
+                values = stack_footer_v6_unpack(data)
+                footer['samples_written'] = values[0]
+                footer['num_chunk_positions'] = values[1]
+
+            # omit possible footer entries from later versions
+            mm.seek(footer_pos + footer_length)
+
+            # read label strings
+            stack.labels = [self._read_string() for _ in range(stack.rank)]
+
+            # read col positions
+            if 'has_col_positions' in footer:
+                stack.col_positions = {}
+                for axis, has_them in enumerate(footer['has_col_positions']):
+                    if has_them:
+                        # read doubles as positions
+                        fmt = '<{}d'.format(stack.shape[axis])
+                        data = mm.read(struct.calcsize(fmt))
+                        values = struct.unpack_from(fmt, data)
+                        stack.col_positions[axis] = values
+
+            # read col labels
+            if 'has_col_labels' in footer:
+                stack.col_labels = {}
+                for axis, has_them in enumerate(footer['has_col_labels']):
+                    if has_them:
+                        # read labels
+                        labels = []
+                        for _ in range(stack.shape[axis]):
+                            label = self._read_string()
+                            labels.append(label)
+                        stack.col_labels[axis] = labels
+
+            # read metadata
+            if 'metadata_length' in footer:
+                stack.metadata = self._read_string(footer['metadata_length'])
+
+            # read flush positions
+            if 'num_flush_points' in footer:
+                length = footer['num_flush_points']
+                fmt = '<{}Q'.format(length)
+                data = mm.read(struct.calcsize(fmt))
+                values = struct.unpack_from(fmt, data)
+                footer['flush_positions'] = values
+
+            # read tag dictionary
+            if 'tag_dictionary_length' in footer:
+                stack.tag_dictionary = {}
+                length = footer['tag_dictionary_length']
+                if length > 0:
+                    # read key, value pairs until len(key) is zero
+                    key = self._read_string()
+                    while len(key) > 0:
+                        value = self._read_string()
+                        stack.tag_dictionary[key] = value
+                        key = self._read_string()
+
+            # read chunk positions
+            chunk_positions = [[0, 0]]
+            for _ in range(footer.get('num_chunk_positions', 0)):
+                fmt = '<2Q'
+                data = mm.read(struct.calcsize(fmt))
+                values = struct.unpack_from(fmt, data)
+                chunk_positions.append(values)
+            footer['chunk_positions'] = chunk_positions
+
+        stack.footer = footer
+
+        # decoder of the stack data, specialized for this stack
+        if stack._compression_type == 1:
+            stack._decoder = partial(_decode_compressed, data_type=stack.data_type, shape=stack.shape)
+        else:
+            stack._decoder = partial(_decode_uncompressed, data_type=stack.data_type, shape=stack.shape)
+
+        return stack
+
+    def _read_stack_name(self, stack_pos: int) -> str:
+        """
+        Internal function. Reads only the name of a stack.
+
+        :param stack_pos: Position of the stack header in the file
+        :return: Name of the stack
+        """
+        mm = self._mapping()
+        name_length = int_unpack(mm, stack_pos + stack_name_length_offset)[0]
+        name_pos = stack_pos + stack_header_len
+        return _decode_string(memoryview(mm)[name_pos:name_pos + name_length])
+
+    def _stack_segments(self, stack: Stack) -> list[tuple[int, int]]:
+        """
+        Internal function. Computes where the data of a stack is in the OBF file.
 
         Supporting the chunked/interleaved storage of stacks with stack format version 6, this is a bit more
         elaborate and also includes a bit of heuristic estimation of the number of compressed bytes
@@ -388,66 +519,64 @@ class File:
         we need to workaround it.
 
         :param stack: A Stack object containing all meta data
+        :return: List of (file position, length) segments of the (possibly compressed) stack data
         """
-        try:
-            # read the whole stack data (works for stack format versions <= 5)
-            # self._file.seek(stack._data_pos)
-            # data = self._file.read(stack._data_length)
-
-            # with chunks (works for min_format_version 6 and also below)
-            pos = 0
-            idx = 0
-            seek_pos = stack._data_pos
-            self._file.seek(seek_pos)
-            data = []
-            if stack._compression_type == 1 and stack.footer['samples_written'] > 0:
-                # if compressed and not empty: we are not completely sure about the length of the written data
-                if 'num_chunk_positions' in stack.footer:
-                    # stack format version >= 6 (with chunks)
-                    bytes_written = min(stack.footer['samples_written']*stack.data_type().itemsize+16, stack.footer['chunk_positions'][-1][0] + stack.footer['stack_end_used_disk'] - stack.footer['chunk_positions'][-1][1])  # this is a bit heuristic and not documented but I don't want to read too much
-                    # stack.footer['chunk_positions'][-1][0] + stack.footer['stack_end_used_disk'] - stack.footer['chunk_positions'][-1][1] is the maximal number of bytes between the begin of the last chunk and the end of the data
-                    # stack.footer['samples_written']*stack.data_type().itemsize+16 is the size of the uncompressed data plus a small overhead for the zip header that is also divisible by all data type sizes in bytes
-                else:
-                    # stack format version < 6 (without chunks)
-                    bytes_written = stack._data_length
+        # with chunks (works for min_format_version 6 and also below)
+        if stack._compression_type == 1 and stack.footer['samples_written'] > 0:
+            # if compressed and not empty: we are not completely sure about the length of the written data
+            if 'num_chunk_positions' in stack.footer:
+                # stack format version >= 6 (with chunks)
+                bytes_written = min(stack.footer['samples_written']*stack.data_type().itemsize+16, stack.footer['chunk_positions'][-1][0] + stack.footer['stack_end_used_disk'] - stack.footer['chunk_positions'][-1][1])  # this is a bit heuristic and not documented but I don't want to read too much
+                # stack.footer['chunk_positions'][-1][0] + stack.footer['stack_end_used_disk'] - stack.footer['chunk_positions'][-1][1] is the maximal number of bytes between the begin of the last chunk and the end of the data
+                # stack.footer['samples_written']*stack.data_type().itemsize+16 is the size of the uncompressed data plus a small overhead for the zip header that is also divisible by all data type sizes in bytes
             else:
-                # if not compressed or empty, we know the number of bytes exactly
-                bytes_written = stack.footer['samples_written'] * stack.data_type().itemsize
-
-            # read (using the algorithm outlined in the format description)==
-            while pos < bytes_written:
-                bytes_to_read = bytes_written - pos
-                if idx < len(stack.footer['chunk_positions']):
-                    if pos + bytes_to_read > stack.footer['chunk_positions'][idx][0]:  # chunk_positions[0] = logical offset, [1] = file offset
-                        bytes_to_read = stack.footer['chunk_positions'][idx][0] - pos
-                        seek_pos = stack.footer['chunk_positions'][idx][1] + stack._data_pos
-                        idx += 1
-                if bytes_to_read > 0:
-                    data.append(self._file.read(bytes_to_read))
-                self._file.seek(seek_pos)
-                pos += bytes_to_read
-
-            data = b"".join(data)  # is there a more efficient way to concatenate byte arrays?
-
-            # if compressed, uncompress
-            if stack._compression_type == 1:
-                zobj = zlib.decompressobj()
-                data = zobj.decompress(data)
-                # data = zlib.decompress(data) # that gave "zlib.error: Error -5 while decompressing data: incomplete or truncated stream" sometimes
-
-            # convert to numpy array
-            array = np.frombuffer(data, dtype=stack.data_type)
-            array = array[:stack.footer['samples_written']]  # not sure if this is needed anymore
-
-            # reshape (with reversed shape and then reverse order of dimensions)
-            array = np.reshape(array, stack.shape[::-1])
-            array = np.transpose(array)
-
-            # store
-            stack._data = array
-        except:
-            self.close()
-            raise
+                # stack format version < 6 (without chunks)
+                bytes_written = stack._data_length
+        else:
+            # if not compressed or empty, we know the number of bytes exactly
+            bytes_written = stack.footer['samples_written'] * stack.data_type().itemsize
+
+        # collect the (file position, length) segments of the data (using the algorithm outlined in the format
+        # description), adjacent segments are merged
+        segments = []
+        pos = 0
+        idx = 0
+        read_pos = stack._data_pos
+        seek_pos = read_pos
+        while pos < bytes_written:
+            bytes_to_read = bytes_written - pos
+            if idx < len(stack.footer['chunk_positions']):
+                if pos + bytes_to_read > stack.footer['chunk_positions'][idx][0]:  # chunk_positions[0] = logical offset, [1] = file offset
+                    bytes_to_read = stack.footer['chunk_positions'][idx][0] - pos
+                    seek_pos = stack.footer['chunk_positions'][idx][1] + stack._data_pos
+                    idx += 1
+            if bytes_to_read > 0:
+                if segments and sum(segments[-1]) == read_pos:
+                    segments[-1] = (segments[-1][0], segments[-1][1] + bytes_to_read)
+                else:
+                    segments.append((read_pos, bytes_to_read))
+            read_pos = seek_pos
+            pos += bytes_to_read
+
+        return segments
+
+    def _read_stack(self, stack: Stack):
+        """
+        Internal function. Reads the data array from a stack from the OBF file as a NumPy array and stores it as the
+        _data attribute of the stack. If called a second time, will re-read the stack.
+
+        :param stack: A Stack object containing all meta data
+        """
+        # read the whole stack data (works for stack format versions <= 5)
+        # self._file.seek(stack._data_pos)
+        # data = self._file.read(stack._data_length)
+
+        mm = self._mapping()
+        segments = self._stack_segments(stack)
+
+        # views on the memory mapped file (no copies), decoded by the decoder of the stack
+        mv = memoryview(mm)
+        stack._data = stack._decoder([mv[start:start + length] for start, length in segments])
 
     def __del__(self):
         """
@@ -456,6 +585,46 @@ class File:
         self.close()
 
 
+class _StackList(Sequence):
+    """
+    For internal use only. The stacks of a File, which reads a stack (header and footer) when it is accessed the first
+    time.
+    """
+
+    def __init__(self, file: File, stack_positions: list[int]):
+        """
+        Initialize with a File object and the positions of the stack headers in the file.
+        """
+        self._file = file
+        self._positions = stack_positions
+        self._stacks = [None] * len(stack_positions)
+        self._names = None
+        # reading stack headers uses the position of the memory mapped file, only one thread at a time may do that
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        with self._lock:
+            stack = self._stacks[index]
+            if stack is None:
+                stack = self._file._read_stack_header(self._positions[index])
+                self._stacks[index] = stack
+        return stack
+
+    def names(self) -> list[str]:
+        """
+        Names of all stacks, reading only the names of stacks that haven't been read yet. Computed only once.
+        """
+        if self._names is None:
+            self._names = [self._file._read_stack_name(position) if stack is None else stack.name
+                           for position, stack in zip(self._positions, self._stacks)]
+        return self._names
+
+
 class Stack:
     """
     A Stack class, holds attributes about stacks
@@ -468,20 +637,46 @@ class Stack:
         self.file = file
         self._data = None
 
-    def __getattr__(self, name: str):
+        # only present in stacks of higher format versions
+        self.labels = None
+        self.si_value = None
+        self.si_dimensions = None
+        self.col_positions = None
+        self.col_labels = None
+        self.metadata = None
+        self.tag_dictionary = None
+
+    @cached_property
+    def pixel_sizes(self) -> list[float]:
+        """
+        Pixel sizes (lengths divided by shape), computed only once.
+        """
+        # if a dimension is 0, the pixel size is NaN in that direction
+        return [length / n if n > 0 else math.nan for length, n in zip(self.lengths, self.shape)]
+
+    def read_roi(self, slices) -> np.ndarray:
+        """
+        Reads only a part (region of interest) of the data. For uncompressed stacks stored contiguously in the file only
+        this part is read from disk, otherwise the whole data is loaded.
+
+        :param slices: Index of the part like in data[slices], e.g. (slice(None), slice(None), 0) for the first XY slice
+        :return: NumPy array of the part (a copy if the part is not contiguous, otherwise possibly a read-only view)
+        """
+        roi = self.data[slices]
+        if not (roi.flags.c_contiguous or roi.flags.f_contiguous):
+            roi = roi.copy()
+        return roi
+
+    @property
+    def data(self) -> np.ndarray:
         """
-        Computes a few convenience attributes on the fly as well as lazy loading of the data
-        :param name: either "pixel_sizes" or "data"
+        Lazy loading of the data.
         """
-        if name == 'pixel_sizes':
-            # if a dimension is 0, the pixel size is NaN in that direction
-            pixel_sizes = [length / n if n > 0 else math.nan for length, n in zip(self.lengths, self.shape)]
-            return pixel_sizes
-        elif name == 'data':
-            if self._data is None:
-                # first time data is called, load it
-                self.file._read_stack(self)
-            return self._data
+        # not a cached_property because before Python 3.12 that serializes the first access across all stacks
+        if self._data is None:
+            # first time data is called, load it
+            self.file._read_stack(self)
+        return self._data
 
 
 class SIUnit:
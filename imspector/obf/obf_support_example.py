@@ -30,12 +30,11 @@ if __name__ == '__main__':
         print(' offsets: {}'.format(stack.offsets))
         print(' data type: {}'.format(stack.data_type.__name__))
 
-        # load stack data and show first 2D image
-        data = stack.data
-        if data.size > 0:  # don't display empty stacks
+        # show first 2D image (only this image is loaded, at least for uncompressed stacks)
+        if len(stack.shape) >= 2 and 0 not in stack.shape:  # don't display 1D or empty stacks
             fig, ax = plt.subplots()
-            idx = [slice(None), slice(None)] + [0] * (len(data.shape) - 2)
-            im = ax.imshow(data[tuple(idx)].reshape(data.shape[:2]), cmap=cm.hot)
+            idx = (slice(None), slice(None)) + (0,) * (len(stack.shape) - 2)
+            im = ax.imshow(stack.read_roi(idx), cmap=cm.hot)
             ax.set_title(stack.name)
 
         plt.show()